@@ -1,5 +1,68 @@
+from functools import lru_cache, singledispatch
+
 import numpy as np
 
+# number of set bits in each possible byte of a packed support mask
+_POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)],
+                     dtype=np.uint8)
+
+
+@singledispatch
+def _to_thresholds(stability_selection, n_boots):
+    """Converts stability selection to an array of thresholds, dispatching
+    on the type of stability_selection."""
+    raise ValueError("Stability selection must be a valid float, int "
+                     "or array.")
+
+
+@_to_thresholds.register(float)
+def _(stability_selection, n_boots):
+    # single float, indicating proportion of bootstraps
+    return _to_thresholds(np.array([stability_selection]), n_boots)
+
+
+@_to_thresholds.register(int)
+def _(stability_selection, n_boots):
+    # single int, indicating number of bootstraps
+    return _to_thresholds(np.array([stability_selection]), n_boots)
+
+
+@_to_thresholds.register(list)
+def _(stability_selection, n_boots):
+    # list, to be converted into numpy array. numpy upcasts ints mixed with
+    # floats, which would turn a number of bootstraps into a proportion, so
+    # a float list must consist of floats only
+    selection_array = np.asarray(stability_selection)
+    if (
+        selection_array.dtype.kind == 'f' and
+        not all(isinstance(idx, float) for idx in stability_selection)
+    ):
+        raise ValueError("Stability selection list must consist of "
+                         "floats or ints.")
+
+    return _to_thresholds(selection_array, n_boots)
+
+
+@_to_thresholds.register(np.ndarray)
+def _(stability_selection, n_boots):
+    # array of floats, scaled straight into an integer array. The cast
+    # truncates, which agrees with rounding down for every threshold that
+    # passes the bounds check
+    if stability_selection.dtype.kind == 'f':
+        selection_thresholds = np.empty(stability_selection.shape,
+                                        dtype=np.intp)
+        np.multiply(stability_selection, n_boots, out=selection_thresholds,
+                    casting='unsafe')
+        return selection_thresholds
+
+    # array of ints, copied so the thresholds do not alias the input
+    elif stability_selection.dtype.kind in 'iu':
+        return stability_selection.astype(np.intp)
+
+    else:
+        raise ValueError("Stability selection array must consist of "
+                         "floats or ints.")
+
 
 def stability_selection_to_threshold(stability_selection, n_boots):
     """Converts user inputted stability selection to an array of
@@ -22,57 +85,14 @@ def stability_selection_to_threshold(stability_selection, n_boots):
         The number of bootstraps that will be used for selection
     """
 
-    # single float, indicating proportion of bootstraps
-    if isinstance(stability_selection, float):
-        selection_thresholds = np.array([int(
-            stability_selection * n_boots
-        )])
-
-    # single int, indicating number of bootstraps
-    elif isinstance(stability_selection, int):
-        selection_thresholds = np.array([int(
-            stability_selection
-        )])
-
-    # list, to be converted into numpy array
-    elif isinstance(stability_selection, list):
-        # list of floats
-        if all(isinstance(idx, float) for idx in stability_selection):
-            selection_thresholds = \
-                n_boots * np.array(stability_selection)
-
-        # list of ints
-        elif all(isinstance(idx, int) for idx in stability_selection):
-            selection_thresholds = np.array(stability_selection)
-
-        else:
-            raise ValueError("Stability selection list must consist of "
-                             "floats or ints.")
-
-    # numpy array
-    elif isinstance(stability_selection, np.ndarray):
-        # np array of floats
-        if np.issubdtype(stability_selection.dtype.type, np.floating):
-            selection_thresholds = n_boots * stability_selection
-
-        # np array of ints
-        elif np.issubdtype(stability_selection.dtype.type, np.integer):
-            selection_thresholds = stability_selection
-
-        else:
-            raise ValueError("Stability selection array must consist of "
-                             "floats or ints.")
-
-    else:
-        raise ValueError("Stability selection must be a valid float, int "
-                         "or array.")
+    selection_thresholds = _to_thresholds(stability_selection, n_boots)
 
     # ensure that ensuing list of selection thresholds satisfies
     # the correct bounds
-    selection_thresholds = selection_thresholds.astype('int')
-    if not (
-        np.all(selection_thresholds <= n_boots) and
-        np.all(selection_thresholds >= 1)
+    if (
+        selection_thresholds.size == 0 or
+        selection_thresholds.min() < 1 or
+        selection_thresholds.max() > n_boots
     ):
         raise ValueError("Stability selection thresholds must be within "
                          "the correct bounds.")
@@ -80,7 +100,30 @@ def stability_selection_to_threshold(stability_selection, n_boots):
     return selection_thresholds
 
 
-def intersection(coefs, selection_thresholds=None):
+def pack_supports(coefs):
+    """Packs the nonzero pattern of selection coefficients into bits along
+    the bootstrap axis.
+
+    Only whether a coefficient is nonzero matters to the intersection, so
+    the packed mask can be stored or communicated in place of the
+    coefficients at 1/64th the size of a float64 array.
+
+    Parameters
+    ----------
+    coefs : np.ndarray, shape (# bootstraps, # lambdas, # features)
+        The coefficients obtained from the selection sweep.
+
+    Returns
+    -------
+    packed : np.ndarray, uint8
+        Bit-packed mask of the nonzero coefficients, with shape
+        (ceil(# bootstraps / 8), # lambdas, # features). Suitable for
+        intersection_packed.
+    """
+    return np.packbits(coefs != 0, axis=0)
+
+
+def intersection(coefs, selection_thresholds=None, packed=False):
     """Performs the intersection operation on selection coefficients
     using stability selection criteria.
 
@@ -108,38 +151,234 @@ def intersection(coefs, selection_thresholds=None):
         The selection thresholds to perform intersection across. By default,
         use *coefs.shape[0]*.
 
+    packed : bool
+        If True, the supports are returned bit-packed along the features
+        axis. Use np.unpackbits(supports, axis=-1, count=n_features) to
+        recover the binary masks.
+
     Returns
     -------
     supports : np.ndarray, shape (# supports, # features), bool
         A list of supports (each as a binary mask with size n_features)
         obtained by performing the intersection across the coefficients. Each
-        support is unique.
+        support is unique. If packed, the supports are instead uint8 with
+        shape (# supports, ceil(# features / 8)).
     """
 
     if selection_thresholds is None:
         selection_thresholds = np.array([coefs.shape[0]])
 
-    n_selection_thresholds = len(selection_thresholds)
+    selection_thresholds = _unique_thresholds(selection_thresholds)
+    n_selection_thresholds = selection_thresholds.size
     n_reg_params = coefs.shape[1]
     n_features = coefs.shape[2]
-    supports = np.zeros(
-        (n_selection_thresholds, n_reg_params, n_features),
-        dtype=bool
-    )
 
-    # iterate over each stability selection threshold
-    for thresh_idx, threshold in enumerate(selection_thresholds):
-        # calculate the support given the specific selection threshold
-        supports[thresh_idx, ...] = \
-            np.count_nonzero(coefs, axis=0) >= threshold
+    intersection_kernel = _intersection_kernel()
+    if intersection_kernel is not None:
+        # count and compare in a single pass over the coefficients
+        supports = np.empty(
+            (n_selection_thresholds, n_reg_params, n_features),
+            dtype=bool
+        )
+        intersection_kernel(
+            np.ascontiguousarray(coefs),
+            selection_thresholds,
+            supports)
+        supports = _unique_supports(supports)
+    else:
+        # the number of bootstraps each feature appears in does not depend
+        # on the threshold, so count once and compare against all
+        # thresholds. The nonzero mask is summed as uint8 to stay on
+        # numpy's integer sum kernel
+        n_nonzero = (coefs != 0).view(np.uint8).sum(axis=0, dtype=np.intp)
+        supports = _threshold_supports(n_nonzero, selection_thresholds)
+
+    if packed:
+        supports = np.packbits(supports, axis=-1)
+
+    return supports
+
+
+def intersection_packed(packed, n_boots, selection_thresholds=None):
+    """Performs the intersection operation on a bit-packed support mask.
+
+    The supports are the same as those of intersection on the coefficients
+    the mask was packed from.
+
+    Parameters
+    ----------
+    packed : np.ndarray, uint8
+        Bit-packed mask of the nonzero coefficients, as returned by
+        pack_supports, with shape (ceil(# bootstraps / 8), # lambdas,
+        # features).
+
+    n_boots : int
+        The number of bootstraps packed into the mask.
+
+    selection_thresholds: array-like, int
+        The selection thresholds to perform intersection across. By default,
+        use *n_boots*.
+
+    Returns
+    -------
+    supports : np.ndarray, shape (# supports, # features), bool
+        The unique supports obtained by performing the intersection.
+    """
+    if packed.dtype != np.uint8 or packed.ndim != 3:
+        raise ValueError("Packed supports must be a 3-d uint8 array "
+                         "returned by pack_supports.")
+    if packed.shape[0] != (n_boots + 7) // 8:
+        raise ValueError("Packed supports do not hold %d bootstraps."
+                         % n_boots)
+
+    if selection_thresholds is None:
+        selection_thresholds = np.array([n_boots])
 
-    # unravel the dimension corresponding to selection thresholds
+    selection_thresholds = _unique_thresholds(selection_thresholds)
 
-    supports = np.squeeze(np.reshape(
-        supports,
-        (n_selection_thresholds * n_reg_params, n_features)
-    ))
+    # each byte of the packed mask holds eight bootstraps
+    n_nonzero = _POPCOUNT[packed].sum(axis=0, dtype=np.intp)
+
+    return _threshold_supports(n_nonzero, selection_thresholds)
+
+
+class IntersectionAccumulator():
+    """Performs the intersection operation incrementally, one bootstrap at
+    a time.
+
+    Rather than holding the coefficients of every bootstrap, only a running
+    count of the bootstraps in which each feature is nonzero is kept, so
+    memory no longer grows with the number of bootstraps. The supports
+    returned by finalize are the same as those of intersection on the
+    stacked coefficients.
+
+    Parameters
+    ----------
+    n_reg_params : int
+        The number of regularization parameters (lambdas).
+
+    n_features : int
+        The number of features.
+
+    Attributes
+    ----------
+    counts_ : np.ndarray, shape (# lambdas, # features), int32
+        The number of bootstraps added so far in which each feature is
+        nonzero.
+
+    n_boots_ : int
+        The number of bootstraps added so far.
+    """
+
+    def __init__(self, n_reg_params, n_features):
+        self.counts_ = np.zeros((n_reg_params, n_features), dtype=np.int32)
+        self.n_boots_ = 0
+
+    def add(self, coefs):
+        """Adds the coefficients of a single bootstrap.
+
+        Parameters
+        ----------
+        coefs : np.ndarray, shape (# lambdas, # features)
+            The coefficients obtained from the selection sweep on one
+            bootstrap.
+        """
+        coefs = np.asarray(coefs)
+        if coefs.shape != self.counts_.shape:
+            raise ValueError("Coefficients must have shape %s, not %s."
+                             % (self.counts_.shape, coefs.shape))
+        np.add(self.counts_, coefs != 0, out=self.counts_)
+        self.n_boots_ += 1
+        return self
+
+    def finalize(self, selection_thresholds=None):
+        """Intersects the bootstraps added so far.
+
+        Parameters
+        ----------
+        selection_thresholds: array-like, int
+            The selection thresholds to perform intersection across. By
+            default, use the number of bootstraps added.
+
+        Returns
+        -------
+        supports : np.ndarray, shape (# supports, # features), bool
+            The unique supports obtained by performing the intersection.
+        """
+        if self.n_boots_ == 0:
+            raise ValueError("No bootstraps have been added.")
+
+        if selection_thresholds is None:
+            selection_thresholds = np.array([self.n_boots_])
+
+        selection_thresholds = _unique_thresholds(selection_thresholds)
+
+        return _threshold_supports(self.counts_, selection_thresholds)
+
+
+def _unique_thresholds(selection_thresholds):
+    """Rounds selection thresholds up to whole numbers of bootstraps, since
+    a count is at least t exactly when it is at least ceil(t), and removes
+    duplicates, which would only produce duplicate supports."""
+    return np.unique(np.ceil(selection_thresholds).astype(np.intp))
+
+
+def _threshold_supports(n_nonzero, selection_thresholds):
+    """Compares the number of bootstraps each feature is nonzero in, of
+    shape (# lambdas, # features), against every selection threshold and
+    returns the unique supports."""
+    supports = n_nonzero[np.newaxis] >= \
+        selection_thresholds.reshape(-1, 1, 1)
+
+    return _unique_supports(supports)
+
+
+def _unique_supports(supports):
+    """Unravels supports of shape (# thresholds, # lambdas, # features) and
+    removes duplicates."""
+    # unravel the dimension corresponding to selection thresholds. supports
+    # is freshly allocated and C-contiguous, so this is a view
+    supports = supports.reshape(-1, supports.shape[-1])
 
     supports = np.unique(supports, axis=0)
 
     return supports
+
+
+@lru_cache(maxsize=None)
+def _intersection_kernel():
+    """Compiles the numba intersection kernel on first use, so that numba is
+    only imported when an intersection is taken. Returns None if numba is
+    not installed."""
+    try:
+        from numba import njit, prange
+    except ImportError:
+        return None
+
+    @njit(parallel=True, cache=True)
+    def intersection_kernel(coefs, selection_thresholds, supports):
+        """Counts the bootstraps in which each feature is nonzero and
+        compares the count against every selection threshold, writing the
+        result into supports of shape (# thresholds, # lambdas, # features).
+
+        The reduction across bootstraps streams through the features axis,
+        so coefs is read fastest when C-contiguous; intersection copies other
+        layouts before calling the kernel.
+        """
+        n_boots, n_reg_params, n_features = coefs.shape
+        n_selection_thresholds = selection_thresholds.shape[0]
+        for reg_idx in prange(n_reg_params):
+            # accumulate across bootstraps with features innermost, so that
+            # the coefficients are read with unit stride
+            counts = np.zeros(n_features, dtype=np.intp)
+            for boot_idx in range(n_boots):
+                for feature_idx in range(n_features):
+                    if coefs[boot_idx, reg_idx, feature_idx] != 0:
+                        counts[feature_idx] += 1
+            for thresh_idx in range(n_selection_thresholds):
+                for feature_idx in range(n_features):
+                    supports[thresh_idx, reg_idx, feature_idx] = \
+                        counts[feature_idx] >= \
+                        selection_thresholds[thresh_idx]
+
+    return intersection_kernel
@@ -103,7 +103,7 @@ setup(
     # for example:
     # $ pip install -e .[dev,test]
     extras_require={
-        'perf': ['mpi4py', 'pycasso'],
+        'perf': ['mpi4py', 'pycasso', 'numba'],
         'dev': dev_requirements
     },
 
@@ -6,6 +6,10 @@ from numpy.testing import assert_raises
 
 from pyuoi.linear_model.utils import stability_selection_to_threshold
 from pyuoi.linear_model.utils import intersection
+from pyuoi.linear_model.utils import pack_supports
+from pyuoi.linear_model.utils import intersection_packed
+from pyuoi.linear_model.utils import IntersectionAccumulator
+from pyuoi.linear_model import utils as lm_utils
 
 from pyuoi.utils import check_logger
 
@@ -16,6 +20,15 @@ except ImportError:
     MPI = None
 
 
+def random_coefs(n_boots=12, n_reg_params=4, n_features=20):
+    """Returns random selection coefficients, about half of which are
+    zero."""
+    rng = np.random.RandomState(0)
+    coefs = rng.randn(n_boots, n_reg_params, n_features)
+    coefs[rng.rand(*coefs.shape) < 0.5] = 0.
+    return coefs
+
+
 def test_stability_selection_to_threshold_int():
     """Tests whether stability_selection_to_threshold correctly outputs the
     correct threshold when provided a single integer."""
@@ -85,6 +98,17 @@ def test_stability_selection_to_threshold_ints_np():
         selection_thresholds,
         np.array([24, 28, 33, 38, 43, 48]))
 
+    # the thresholds do not inherit the dtype of the input
+    selection_thresholds = stability_selection_to_threshold(
+        test_ints_np.astype(np.uint8), n_boots_sel)
+    assert selection_thresholds.dtype == np.intp
+
+    # nor do they share memory with it
+    test_ints_intp = test_ints_np.astype(np.intp)
+    selection_thresholds = stability_selection_to_threshold(
+        test_ints_intp, n_boots_sel)
+    assert not np.shares_memory(selection_thresholds, test_ints_intp)
+
 
 def test_stability_selection_to_threshold_floats_np():
     """Tests whether stability_selection_to_threshold correctly outputs the
@@ -141,11 +165,36 @@ def test_stability_selection_to_threshold_one_bootstrap():
         np.array([1]))
 
 
+def test_stability_selection_to_threshold_lower_bound():
+    """Tests that stability_selection_to_threshold accepts a threshold of a
+    single bootstrap and rejects a threshold of zero bootstraps."""
+    n_boots_sel = 48
+
+    assert_array_equal(
+        stability_selection_to_threshold(1, n_boots_sel), np.array([1]))
+    assert_array_equal(
+        stability_selection_to_threshold([1, 48], n_boots_sel),
+        np.array([1, 48]))
+
+    assert_raises(
+        ValueError,
+        stability_selection_to_threshold,
+        [0, 48],
+        n_boots_sel)
+
+    assert_raises(
+        ValueError,
+        stability_selection_to_threshold,
+        0.01,
+        n_boots_sel)
+
+
 def test_stability_selection_to_threshold_input_value_error():
     """Tests whether stability_selection_to_threshold properly raises an error
     when it receives objects without ints or floats."""
     n_boots_sel = 48
     stability_selection_list = [0, 1, 'a']
+    stability_selection_mixed_list = [1, 0.5]
     stability_selection_np_array = np.array([0, 1, 'a'])
     stability_selection_dict = {0: 'a', 1: 'b'}
 
@@ -155,6 +204,12 @@ def test_stability_selection_to_threshold_input_value_error():
         stability_selection_list,
         n_boots_sel)
 
+    assert_raises(
+        ValueError,
+        stability_selection_to_threshold,
+        stability_selection_mixed_list,
+        n_boots_sel)
+
     assert_raises(
         ValueError,
         stability_selection_to_threshold,
@@ -184,6 +239,26 @@ def test_stability_selection_reject_negative_numbers():
         n_boots_sel)
 
 
+def test_stability_selection_to_threshold_int_float_distinct():
+    """Tests that stability_selection_to_threshold treats an int as a number
+    of bootstraps and a float of equal value as a proportion of them, and
+    that the shape of array inputs is kept."""
+    n_boots_sel = 48
+
+    assert_array_equal(
+        stability_selection_to_threshold(1, n_boots_sel), np.array([1]))
+    assert_array_equal(
+        stability_selection_to_threshold(1., n_boots_sel), np.array([48]))
+    assert_array_equal(
+        stability_selection_to_threshold([1], n_boots_sel), np.array([1]))
+    assert_array_equal(
+        stability_selection_to_threshold([1.], n_boots_sel), np.array([48]))
+
+    selection_thresholds = stability_selection_to_threshold(
+        np.array([[0.5, 1.]]), n_boots_sel)
+    assert_array_equal(selection_thresholds, np.array([[24, 48]]))
+
+
 def test_intersection():
     """Tests whether intersection correctly performs a hard intersection."""
 
@@ -277,6 +352,16 @@ def test_intersection_with_stability_selection_multiple_thresholds():
         np.sort(estimated_intersection, axis=0))
 
 
+def test_intersection_duplicate_thresholds():
+    """Tests that duplicated selection thresholds give the same supports as
+    the unique thresholds."""
+    coefs = random_coefs()
+
+    assert_array_equal(
+        intersection(coefs, np.array([12, 6, 6, 12, 6])),
+        intersection(coefs, np.array([6, 12])))
+
+
 def test_intersection_no_thresholds():
     """Tests that the intersection method correctly calculates the intersection
     using the number of bootstraps as the default selection threshold."""
@@ -307,6 +392,134 @@ def test_intersection_no_thresholds():
         np.sort(estimated_intersection, axis=0))
 
 
+def test_intersection_single_support():
+    """Tests that intersection returns a 2-d array of supports when there is
+    only one threshold and one lambda."""
+
+    coefs = np.array([
+        [[2, 1, -1, 0, 4]],
+        [[2, 0, 0, 0, 0]],
+        [[2, 0, 3, 0, 0]]])
+
+    estimated_intersection = intersection(
+        coefs=coefs,
+        selection_thresholds=np.array([2]))
+
+    assert_array_equal(
+        estimated_intersection,
+        np.array([[True, False, True, False, False]]))
+
+
+def test_intersection_packed_output():
+    """Tests that intersection can return bit-packed supports."""
+    coefs = random_coefs()
+    selection_thresholds = np.array([1, 6, 12])
+
+    supports = intersection(coefs, selection_thresholds)
+    packed_supports = intersection(coefs, selection_thresholds, packed=True)
+
+    assert packed_supports.shape == (supports.shape[0], 3)
+    assert packed_supports.dtype == np.uint8
+    assert_array_equal(
+        np.unpackbits(packed_supports, axis=-1, count=20).astype(bool),
+        supports)
+
+
+def test_intersection_accumulator():
+    """Tests that accumulating bootstraps one at a time gives the same
+    supports as intersection on the stacked coefficients."""
+    coefs = random_coefs()
+
+    accumulator = IntersectionAccumulator(4, 20)
+    assert_raises(ValueError, accumulator.finalize)
+    for coef in coefs:
+        accumulator.add(coef)
+
+    # a single lambda's coefficients must not broadcast across lambdas
+    assert_raises(ValueError, accumulator.add, coefs[0, 0])
+
+    assert accumulator.n_boots_ == 12
+    for selection_thresholds in [None, np.array([1, 6, 12])]:
+        assert_array_equal(
+            accumulator.finalize(selection_thresholds),
+            intersection(coefs, selection_thresholds))
+
+
+def test_intersection_packed_supports():
+    """Tests that intersection_packed gives the same supports as
+    intersection on the coefficients the mask was packed from."""
+    coefs = random_coefs(n_boots=11)
+    packed = pack_supports(coefs)
+
+    assert packed.shape == (2, 4, 20)
+    assert packed.dtype == np.uint8
+
+    for selection_thresholds in [None, np.array([1, 6, 11])]:
+        assert_array_equal(
+            intersection(coefs, selection_thresholds),
+            intersection_packed(packed, 11, selection_thresholds))
+
+    # the mask must be uint8 and hold the given number of bootstraps
+    assert_raises(ValueError, intersection_packed, coefs, 11)
+    assert_raises(ValueError, intersection_packed, packed, 17)
+
+
+def test_intersection_backends_agree(monkeypatch):
+    """Tests that the numpy and numba implementations of intersection give
+    the same supports."""
+    if lm_utils._intersection_kernel() is None:
+        pytest.skip('numba not installed.')
+
+    coefs = random_coefs()
+    selection_thresholds = np.array([1, 6, 12])
+    numba_supports = intersection(coefs, selection_thresholds)
+
+    monkeypatch.setattr(lm_utils, '_intersection_kernel', lambda: None)
+    numpy_supports = intersection(coefs, selection_thresholds)
+
+    assert_array_equal(numba_supports, numpy_supports)
+
+
+@pytest.mark.parametrize('backend', ['numpy', 'numba'])
+def test_intersection_backends(backend, monkeypatch):
+    """Tests that the numpy and numba implementations of intersection both
+    give the expected supports."""
+    if backend == 'numpy':
+        monkeypatch.setattr(lm_utils, '_intersection_kernel', lambda: None)
+    elif lm_utils._intersection_kernel() is None:
+        pytest.skip('numba not installed.')
+
+    coefs = np.array([
+        [[2, 1, -1, 0, 4],
+         [4, 0, 2, -1, 5],
+         [1, 2, 3, 4, 5]],
+        [[2, 0, 0, 0, 0],
+         [3, 1, 1, 0, 3],
+         [6, 7, 8, 9, 10]],
+        [[2, 0, 0, 0, 0],
+         [2, -1, 3, 0, 2],
+         [2, 4, 6, 8, 9]]], dtype=float)
+
+    true_intersection = np.array([
+        [True, False, False, False, False],
+        [True, True, True, False, True],
+        [True, True, True, True, True],
+        [True, False, True, False, True]])
+
+    estimated_intersection = intersection(
+        coefs=coefs,
+        selection_thresholds=np.array([2, 3]))
+
+    assert_array_equal(
+        np.sort(true_intersection, axis=0),
+        np.sort(estimated_intersection, axis=0))
+
+    # non-integer thresholds are rounded up to whole bootstraps
+    assert_array_equal(
+        intersection(coefs=coefs, selection_thresholds=np.array([2.5])),
+        intersection(coefs=coefs, selection_thresholds=np.array([3])))
+
+
 @pytest.mark.fast
 def test_check_logger():
     """Test that check_logger builds logger correctly"""